@@ -3,13 +3,19 @@
 package hints
 
 import (
+	"bufio"
 	"encoding/json"
 	"fmt"
 	"io"
+	"math"
 	"os"
 	"strconv"
 	"strings"
+	"sync"
 	"unicode"
+	"unicode/utf8"
+
+	"golang.org/x/exp/slices"
 
 	"kitty/tools/cli"
 	"kitty/tools/tty"
@@ -22,19 +28,39 @@ import (
 
 var _ = fmt.Print
 
+type line_scanner interface {
+	Scan() bool
+	Text() string
+}
+
+// Adapts a bufio.Scanner to return lines without copying them, the returned
+// lines are only valid until the next call to Scan()
+type unsafe_line_scanner struct{ *bufio.Scanner }
+
+func (self unsafe_line_scanner) Text() string { return utils.UnsafeBytesToString(self.Bytes()) }
+
 func convert_text(text string, cols int) string {
-	lines := make([]string, 0, 64)
-	empty_line := strings.Repeat("\x00", cols) + "\n"
-	s1 := utils.NewLineScanner(text)
+	return convert_lines(utils.NewLineScanner(text), cols, len(text)+(strings.Count(text, "\n")+1)*(cols+1))
+}
+
+func convert_lines(s1 line_scanner, cols, size_hint int) string {
+	// Write directly into a single buffer rather than building a slice of
+	// padded lines and joining them, as screens can have many thousands of
+	// lines
+	ans := strings.Builder{}
+	ans.Grow(size_hint)
+	padding := strings.Repeat("\x00", cols)
 	for s1.Scan() {
 		full_line := s1.Text()
 		if full_line == "" {
-			lines = append(lines, empty_line)
+			ans.WriteString(padding)
+			ans.WriteByte('\n')
 			continue
 		}
 		if strings.TrimRight(full_line, "\r") == "" {
 			for i := 0; i < len(full_line); i++ {
-				lines = append(lines, empty_line)
+				ans.WriteString(padding)
+				ans.WriteByte('\n')
 			}
 			continue
 		}
@@ -43,38 +69,47 @@ func convert_text(text string, cols int) string {
 		for s2.Scan() {
 			line := s2.Text()
 			if line != "" {
-				line_sz := wcswidth.Stringwidth(line)
-				extra := cols - line_sz
-				if extra > 0 {
-					line += strings.Repeat("\x00", extra)
+				if appended {
+					ans.WriteByte('\r')
+				}
+				ans.WriteString(line)
+				if extra := cols - wcswidth.Stringwidth(line); extra > 0 {
+					ans.WriteString(padding[:extra])
 				}
-				lines = append(lines, line)
-				lines = append(lines, "\r")
 				appended = true
 			}
 		}
 		if appended {
-			lines[len(lines)-1] = "\n"
+			ans.WriteByte('\n')
 		}
 	}
-	ans := strings.Join(lines, "")
-	return strings.TrimRight(ans, "\r\n")
+	return strings.TrimRight(ans.String(), "\r\n")
 }
 
-func parse_input(text string) string {
+func screen_width() int {
 	cols, err := strconv.Atoi(os.Getenv("OVERLAID_WINDOW_COLS"))
 	if err == nil {
-		return convert_text(text, cols)
+		return cols
 	}
 	term, err := tty.OpenControllingTerm()
 	if err == nil {
 		sz, err := term.GetSize()
 		term.Close()
 		if err == nil {
-			return convert_text(text, int(sz.Col))
+			return int(sz.Col)
 		}
 	}
-	return convert_text(text, 80)
+	return 80
+}
+
+// Convert the input line by line as it is read, so that the raw screen
+// contents, which can include a lot of scrollback, are never held in memory
+// in addition to the converted text
+func parse_input(input io.Reader) (string, error) {
+	scanner := bufio.NewScanner(input)
+	scanner.Buffer(make([]byte, 0, 64*1024), math.MaxInt)
+	ans := convert_lines(unsafe_line_scanner{scanner}, screen_width(), 0)
+	return ans, scanner.Err()
 }
 
 type Result struct {
@@ -89,41 +124,120 @@ type Result struct {
 	Cwd                  string           `json:"cwd"`
 }
 
-func encode_hint(num int, alphabet string) (res string) {
-	runes := []rune(alphabet)
-	d := len(runes)
-	for res == "" || num > 0 {
-		res = string(runes[num%d]) + res
+func encode_hint(num int, alphabet []rune) string {
+	// fill the digits in from the end of a fixed size buffer rather than
+	// prepending to a string
+	var buf [64]rune
+	d := len(alphabet)
+	pos := len(buf)
+	for pos == len(buf) || num > 0 {
+		pos--
+		buf[pos] = alphabet[num%d]
 		num /= d
 	}
-	return
+	return string(buf[pos:])
+}
+
+func alphabet_index_map(alphabet string) map[rune]int {
+	ans := make(map[rune]int, len(alphabet))
+	for i, c := range []rune(alphabet) {
+		ans[c] = i
+	}
+	return ans
 }
 
+var default_alphabet_index_map = sync.OnceValue(func() map[rune]int {
+	return alphabet_index_map(DEFAULT_HINT_ALPHABET)
+})
+
 func decode_hint(x string, alphabet string) (ans int) {
-	base := len(alphabet)
-	index_map := make(map[rune]int, len(alphabet))
-	for i, c := range alphabet {
-		index_map[c] = i
+	var index_map map[rune]int
+	if alphabet == DEFAULT_HINT_ALPHABET {
+		index_map = default_alphabet_index_map()
+	} else {
+		index_map = alphabet_index_map(alphabet)
 	}
+	base := utf8.RuneCountInString(alphabet)
 	for _, char := range x {
 		ans = ans*base + index_map[char]
 	}
 	return
 }
 
+// Remove the null padding and convert line endings for display
+var screen_cleaner = sync.OnceValue(func() *strings.Replacer {
+	return strings.NewReplacer("\x00", "", "\r", "\r\n", "\n", "\r\n")
+})
+
+// A prefix tree of hints, used to find the marks matching the current input
+// without scanning all hints on every keystroke
+type hint_trie struct {
+	children  map[rune]*hint_trie
+	mark      *Mark
+	num_marks int
+}
+
+func (self *hint_trie) add(hint string, m *Mark) {
+	// Custom processors can produce marks with the same index, and hence the
+	// same hint, count them once with the last one winning, as for index_map
+	if existing := self.descend(hint); existing != nil && existing.mark != nil {
+		existing.mark = m
+		return
+	}
+	node := self
+	node.num_marks++
+	for _, ch := range hint {
+		child := node.children[ch]
+		if child == nil {
+			if node.children == nil {
+				node.children = make(map[rune]*hint_trie, 4)
+			}
+			child = &hint_trie{}
+			node.children[ch] = child
+		}
+		child.num_marks++
+		node = child
+	}
+	node.mark = m
+}
+
+// Return the node for the specified prefix or nil if no hint has that prefix
+func (self *hint_trie) descend(prefix string) *hint_trie {
+	node := self
+	for _, ch := range prefix {
+		if node = node.children[ch]; node == nil {
+			break
+		}
+	}
+	return node
+}
+
+// Return the mark in this subtree if it contains exactly one mark
+func (self *hint_trie) only_mark() *Mark {
+	if self == nil || self.num_marks != 1 {
+		return nil
+	}
+	node := self
+	for node.mark == nil {
+		for _, child := range node.children {
+			node = child
+		}
+	}
+	return node.mark
+}
+
 func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 	output := tui.KittenOutputSerializer()
 	if tty.IsTerminal(os.Stdin.Fd()) {
 		return 1, fmt.Errorf("You must pass the text to be hinted on STDIN")
 	}
-	stdin, err := io.ReadAll(os.Stdin)
-	if err != nil {
-		return 1, fmt.Errorf("Failed to read from STDIN with error: %w", err)
-	}
 	if len(args) > 0 && o.CustomizeProcessing == "" && o.Type != "linenum" {
 		return 1, fmt.Errorf("Extra command line arguments present: %s", strings.Join(args, " "))
 	}
-	input_text := parse_input(utils.UnsafeBytesToString(stdin))
+	input_text, err := parse_input(os.Stdin)
+	if err != nil {
+		return 1, fmt.Errorf("Failed to read from STDIN with error: %w", err)
+	}
 	text, all_marks, index_map, err := find_marks(input_text, o, os.Args[2:]...)
 	if err != nil {
 		return 1, err
@@ -138,7 +252,17 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 	if alphabet == "" {
 		alphabet = DEFAULT_HINT_ALPHABET
 	}
-	ignore_mark_indices := utils.NewSet[int](8)
+	alphabet_runes := []rune(alphabet)
+	alphabet_chars := utils.NewSetWithItems(alphabet_runes...)
+	// positions in all_marks of the marks that have not yet been selected,
+	// updated on selection so that rendering does not need to filter them
+	active_marks := make([]int, len(all_marks))
+	for i := range active_marks {
+		active_marks[i] = i
+	}
+	ignore_mark := func(idx int) {
+		active_marks = slices.DeleteFunc(active_marks, func(i int) bool { return all_marks[i].Index == idx })
+	}
 	window_title := o.WindowTitle
 	if window_title == "" {
 		switch o.Type {
@@ -166,15 +290,35 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 		return
 	}
 	fctx := style.Context{AllowEscapeCodes: true}
-	faint := fctx.SprintFunc("dim")
-	hint_style := fctx.SprintFunc(fmt.Sprintf("fg=%s bg=%s bold", o.HintsForegroundColor, o.HintsBackgroundColor))
-	text_style := fctx.SprintFunc(fmt.Sprintf("fg=%s bold", o.HintsTextColor))
-
-	highlight_mark := func(m *Mark, mark_text string) string {
-		hint := encode_hint(m.Index, alphabet)
-		if current_input != "" && !strings.HasPrefix(hint, current_input) {
-			return faint(mark_text)
-		}
+	// the styles are fixed, so compute their escape codes once and write
+	// them around the text directly
+	faint_prefix, faint_suffix := fctx.PrefixAndSuffix("dim")
+	hint_prefix, hint_suffix := fctx.PrefixAndSuffix(fmt.Sprintf("fg=%s bg=%s bold", o.HintsForegroundColor, o.HintsBackgroundColor))
+	text_prefix, text_suffix := fctx.PrefixAndSuffix(fmt.Sprintf("fg=%s bold", o.HintsTextColor))
+
+	// the hints never change, so encode them once instead of on every
+	// keystroke and render
+	hint_strings := make([]string, len(all_marks))
+	for i := range all_marks {
+		hint_strings[i] = encode_hint(all_marks[i].Index, alphabet_runes)
+	}
+	hints := &hint_trie{}
+	for i, hint := range hint_strings {
+		hints.add(hint, &all_marks[i])
+	}
+	input_node := hints
+
+	// Screen text is cleaned up for display as it is written into the render
+	// buffer, so that rendering produces the final output in one pass,
+	// without intermediate copies of the whole screen
+	cleaner := screen_cleaner()
+	write_text := func(b *strings.Builder, s string) {
+		_, _ = cleaner.WriteString(b, s)
+	}
+
+	// Write the highlighted form of a mark whose hint matches the current
+	// input directly into the output, without creating intermediate strings
+	write_highlighted_mark := func(b *strings.Builder, m *Mark, mark_text, hint string) {
 		hint = hint[len(current_input):]
 		if hint == "" {
 			hint = " "
@@ -184,36 +328,86 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 		} else {
 			mark_text = mark_text[len(hint):]
 		}
-		ans := hint_style(hint) + text_style(mark_text)
-		return fmt.Sprintf("\x1b]8;;mark:%d\a%s\x1b]8;;\a", m.Index, ans)
+		b.WriteString("\x1b]8;;mark:")
+		b.WriteString(strconv.Itoa(m.Index))
+		b.WriteByte('\a')
+		b.WriteString(hint_prefix)
+		b.WriteString(hint)
+		b.WriteString(hint_suffix)
+		b.WriteString(text_prefix)
+		write_text(b, mark_text)
+		b.WriteString(text_suffix)
+		b.WriteString("\x1b]8;;\a")
+	}
+
+	// A mark is rendered either faint, when its hint does not match the
+	// current input, or with its full hint, when there is no input. Neither
+	// form depends on the input, so cache them to avoid rebuilding the escape
+	// codes for every mark on every keystroke.
+	faint_fragments := make([]string, len(all_marks))
+	hint_fragments := make([]string, len(all_marks))
+	write_mark := func(b *strings.Builder, i int) {
+		m := &all_marks[i]
+		mark_text := text[m.Start:m.End]
+		switch {
+		case current_input == "":
+			if hint_fragments[i] == "" {
+				f := strings.Builder{}
+				write_highlighted_mark(&f, m, mark_text, hint_strings[i])
+				hint_fragments[i] = f.String()
+			}
+			b.WriteString(hint_fragments[i])
+		case !strings.HasPrefix(hint_strings[i], current_input):
+			if faint_fragments[i] == "" {
+				f := strings.Builder{}
+				f.WriteString(faint_prefix)
+				write_text(&f, mark_text)
+				f.WriteString(faint_suffix)
+				faint_fragments[i] = f.String()
+			}
+			b.WriteString(faint_fragments[i])
+		default:
+			write_highlighted_mark(b, m, mark_text, hint_strings[i])
+		}
 	}
 
 	render := func() string {
-		ans := text
-		for i := len(all_marks) - 1; i >= 0; i-- {
+		// all_marks are sorted by start offset and do not overlap, so the
+		// screen can be built in a single pass instead of splicing every
+		// mark into a fresh copy of it
+		b := strings.Builder{}
+		b.Grow(len(text) + len(all_marks)*64)
+		pos := 0
+		for _, i := range active_marks {
 			mark := &all_marks[i]
-			if ignore_mark_indices.Has(mark.Index) {
-				continue
-			}
-			mtext := highlight_mark(mark, ans[mark.Start:mark.End])
-			ans = ans[:mark.Start] + mtext + ans[mark.End:]
+			write_text(&b, text[pos:mark.Start])
+			write_mark(&b, i)
+			pos = mark.End
 		}
-		ans = strings.ReplaceAll(ans, "\x00", "")
-		return strings.TrimRightFunc(strings.NewReplacer("\r", "\r\n", "\n", "\r\n").Replace(ans), unicode.IsSpace)
+		write_text(&b, text[pos:])
+		return strings.TrimRightFunc(b.String(), unicode.IsSpace)
 	}
 
+	// the text currently on screen, used to avoid re-sending an unchanged
+	// screen to the terminal
+	drawn_text := ""
 	draw_screen := func() {
-		lp.StartAtomicUpdate()
-		defer lp.EndAtomicUpdate()
 		if current_text == "" {
 			current_text = render()
 		}
+		if current_text == drawn_text {
+			return
+		}
+		drawn_text = current_text
+		lp.StartAtomicUpdate()
+		defer lp.EndAtomicUpdate()
 		lp.ClearScreen()
 		lp.QueueWriteString(current_text)
 	}
 	reset := func() {
 		current_input = ""
 		current_text = ""
+		input_node = hints
 	}
 
 	lp.OnInitialize = func() (string, error) {
@@ -229,6 +423,9 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 		return ""
 	}
 	lp.OnResize = func(old_size, new_size loop.ScreenSize) error {
+		if old_size.WidthCells != new_size.WidthCells || old_size.HeightCells != new_size.HeightCells {
+			drawn_text = ""
+		}
 		draw_screen()
 		return nil
 	}
@@ -244,7 +441,7 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 			if m, ok := index_map[r.Mark]; ok {
 				chosen = append(chosen, m)
 				if o.Multiple {
-					ignore_mark_indices.Add(m.Index)
+					ignore_mark(m.Index)
 					reset()
 				} else {
 					lp.Quit(0)
@@ -259,22 +456,19 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 	lp.OnText = func(text string, _, _ bool) error {
 		changed := false
 		for _, ch := range text {
-			if strings.ContainsRune(alphabet, ch) {
+			if alphabet_chars.Has(ch) {
 				current_input += string(ch)
+				if input_node != nil {
+					input_node = input_node.children[ch]
+				}
 				changed = true
 			}
 		}
 		if changed {
-			matches := []*Mark{}
-			for idx, m := range index_map {
-				if eh := encode_hint(idx, alphabet); strings.HasPrefix(eh, current_input) {
-					matches = append(matches, m)
-				}
-			}
-			if len(matches) == 1 {
-				chosen = append(chosen, matches[0])
+			if m := input_node.only_mark(); m != nil {
+				chosen = append(chosen, m)
 				if o.Multiple {
-					ignore_mark_indices.Add(matches[0].Index)
+					ignore_mark(m.Index)
 					reset()
 				} else {
 					lp.Quit(0)
@@ -295,6 +489,7 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 				r = r[:len(r)-1]
 				current_input = string(r)
 				current_text = ""
+				input_node = hints.descend(current_input)
 			}
 			draw_screen()
 		} else if ev.MatchesPressOrRepeat("enter") || ev.MatchesPressOrRepeat("space") {
@@ -303,7 +498,7 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 				idx := decode_hint(current_input, alphabet)
 				if m := index_map[idx]; m != nil {
 					chosen = append(chosen, m)
-					ignore_mark_indices.Add(idx)
+					ignore_mark(idx)
 					if o.Multiple {
 						reset()
 						draw_screen()
@@ -311,8 +506,7 @@ func main(_ *cli.Command, o *Options, args []string) (rc int, err error) {
 						lp.Quit(0)
 					}
 				} else {
-					current_input = ""
-					current_text = ""
+					reset()
 					draw_screen()
 				}
 			}
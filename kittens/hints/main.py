@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # License: GPL v3 Copyright: 2018, Kovid Goyal <kovid at kovidgoyal.net>
 
+import os
 import sys
 from functools import lru_cache
 from typing import Any, Dict, List, Optional, Sequence, Tuple
@@ -16,16 +17,30 @@
 
 DEFAULT_REGEX = r'(?m)^\s*(.+)\s*$'
 
+custom_processor_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+
+def run_custom_processor(path: str) -> Dict[str, Any]:
+    # cached so that the boss process does not re-run the file every time the
+    # kitten is used, re-run when the file is modified to pick up edits
+    mtime = os.stat(path).st_mtime_ns
+    x = custom_processor_cache.get(path)
+    if x is None or x[0] != mtime:
+        import runpy
+        x = custom_processor_cache[path] = mtime, runpy.run_path(path, run_name='__main__')
+    return x[1]
+
+
 def load_custom_processor(customize_processing: str) -> Any:
     if customize_processing.startswith('::import::'):
+        # imported modules are already cached in sys.modules
         import importlib
         m = importlib.import_module(customize_processing[len('::import::'):])
         return {k: getattr(m, k) for k in dir(m)}
     if customize_processing == '::linenum::':
         return {'handle_result': linenum_handle_result}
     custom_path = resolve_custom_file(customize_processing)
-    import runpy
-    return runpy.run_path(custom_path, run_name='__main__')
+    return run_custom_processor(custom_path)
 
 class Mark:
 
@@ -0,0 +1,93 @@
+// License: GPLv3 Copyright: 2023, Kovid Goyal, <kovid at kovidgoyal.net>
+
+package hints
+
+import (
+	"fmt"
+	"strings"
+	"testing"
+)
+
+var _ = fmt.Print
+
+func TestHintTrie(t *testing.T) {
+	alphabet := []rune("ab")
+	marks := make([]Mark, 0, 16)
+	for i := 0; i < 12; i++ {
+		marks = append(marks, Mark{Index: i})
+	}
+	// custom processors can produce duplicate indices
+	marks = append(marks, Mark{Index: 5, Text: "dup"}, Mark{Index: 9, Text: "dup"})
+	trie := &hint_trie{}
+	by_index := make(map[int]*Mark, len(marks))
+	for i := range marks {
+		trie.add(encode_hint(marks[i].Index, alphabet), &marks[i])
+		by_index[marks[i].Index] = &marks[i]
+	}
+
+	var check func(prefix string)
+	check = func(prefix string) {
+		var expected *Mark
+		num_matches := 0
+		for idx, m := range by_index {
+			if strings.HasPrefix(encode_hint(idx, alphabet), prefix) {
+				num_matches++
+				expected = m
+			}
+		}
+		if num_matches != 1 {
+			expected = nil
+		}
+		if actual := trie.descend(prefix).only_mark(); actual != expected {
+			t.Fatalf("Incorrect unique match for prefix %#v: %v != %v", prefix, expected, actual)
+		}
+		if len(prefix) < 5 {
+			for _, ch := range alphabet {
+				check(prefix + string(ch))
+			}
+		}
+	}
+	check("")
+
+	// a hint that is a prefix of other hints is not a unique match
+	if m := trie.descend("b").only_mark(); m != nil {
+		t.Fatalf("The hint b which is a prefix of other hints was a unique match")
+	}
+	if m := trie.descend(encode_hint(9, alphabet)).only_mark(); m == nil || m.Text != "dup" {
+		t.Fatalf("Duplicate index did not resolve to the last mark: %v", m)
+	}
+}
+
+func TestHintEncoding(t *testing.T) {
+	for _, alphabet := range []string{DEFAULT_HINT_ALPHABET, "äöü"} {
+		runes := []rune(alphabet)
+		seen := make(map[string]bool, 2000)
+		for i := 0; i < 2000; i++ {
+			hint := encode_hint(i, runes)
+			if seen[hint] {
+				t.Fatalf("Hint %#v for %d with alphabet %#v is not unique", hint, i, alphabet)
+			}
+			seen[hint] = true
+			if d := decode_hint(hint, alphabet); d != i {
+				t.Fatalf("Decoding hint %#v with alphabet %#v gave %d instead of %d", hint, alphabet, d, i)
+			}
+		}
+	}
+}
+
+func TestParseInput(t *testing.T) {
+	cols := 20
+	t.Setenv("OVERLAID_WINDOW_COLS", fmt.Sprint(cols))
+	for _, text := range []string{
+		"", "a", "a\n", "a\nb", "a\r\nb\r\n", "a\r\r\nb", "\r\r\n", "a\n\n\nb\n\n", "x\ry\rz\n",
+		"short\n" + strings.Repeat("long", 20000) + "\nend\n\n", // longer than the initial scan buffer
+	} {
+		actual, err := parse_input(strings.NewReader(text))
+		if err != nil {
+			t.Fatalf("Parsing %#v failed with error: %s", text, err)
+		}
+		if expected := convert_text(text, cols); actual != expected {
+			t.Fatalf("Parsing %#v from a reader did not match converting it:\n%#v\n%#v", text, expected, actual)
+		}
+	}
+}
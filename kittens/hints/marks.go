@@ -41,6 +41,14 @@ func default_linenum_regex() string {
 	return fmt.Sprintf(`(?P<path>%s):(?P<line>\d+)`, path_regex())
 }
 
+var sanitize_regex = sync.OnceValue(func() *regexp.Regexp {
+	return regexp.MustCompile("[\r\n\x00]")
+})
+
+var linenum_suffix_pat = sync.OnceValue(func() *regexp.Regexp {
+	return regexp.MustCompile(`:\d+$`)
+})
+
 type Mark struct {
 	Index        int            `json:"index"`
 	Start        int            `json:"start"`
@@ -157,15 +165,35 @@ func matching_remover(openers ...string) PostProcessorFunc {
 }
 
 func linenum_group_processor(gd map[string]string) {
-	pat := utils.MustCompile(`:\d+$`)
-	gd[`path`] = pat.ReplaceAllStringFunc(gd["path"], func(m string) string {
+	gd[`path`] = linenum_suffix_pat().ReplaceAllStringFunc(gd["path"], func(m string) string {
 		gd["line"] = m[1:]
 		return ``
 	})
 	gd[`path`] = utils.Expanduser(gd[`path`])
 }
 
+// Combine post processors into a single function so that matching only
+// needs to make one call per match. Processing stops at the first post
+// processor that rejects the match by returning a negative start.
+func chain_post_processors(funcs ...PostProcessorFunc) PostProcessorFunc {
+	switch len(funcs) {
+	case 0:
+		return nil
+	case 1:
+		return funcs[0]
+	}
+	return func(text string, s, e int) (int, int) {
+		for _, f := range funcs {
+			if s, e = f(text, s, e); s < 0 {
+				break
+			}
+		}
+		return s, e
+	}
+}
+
 var PostProcessorMap = sync.OnceValue(func() map[string]PostProcessorFunc {
+	brackets, quotes := matching_remover("(", "{", "[", "<"), matching_remover("'", `"`, "“", "‘")
 	return map[string]PostProcessorFunc{
 		"url": func(text string, s, e int) (int, int) {
 			if s > 4 && text[s-5:s] == "link:" { // asciidoc URLs
@@ -179,11 +207,11 @@ var PostProcessorMap = sync.OnceValue(func() map[string]PostProcessorFunc {
 				e--
 			}
 			// truncate url at closing bracket/quote
-			if s > 0 && e <= len(text) && closing_bracket_for(char_at(text, s-1)) != "" {
-				q := closing_bracket_for(char_at(text, s-1))
-				idx := strings.Index(text[s:], q)
-				if idx > 0 {
-					e = s + idx
+			if s > 0 && e <= len(text) {
+				if q := closing_bracket_for(char_at(text, s-1)); q != "" {
+					if idx := strings.Index(text[s:], q); idx > 0 {
+						e = s + idx
+					}
 				}
 			}
 			// reStructuredText URLs
@@ -193,8 +221,9 @@ var PostProcessorMap = sync.OnceValue(func() map[string]PostProcessorFunc {
 			return s, e
 		},
 
-		"brackets": matching_remover("(", "{", "[", "<"),
-		"quotes":   matching_remover("'", `"`, "“", "‘"),
+		"brackets":            brackets,
+		"quotes":              quotes,
+		"brackets_and_quotes": chain_post_processors(brackets, quotes),
 		"ip": func(text string, s, e int) (int, int) {
 			addr := ipaddr.NewHostName(text[s:e])
 			if !addr.IsAddress() {
@@ -347,7 +376,25 @@ func url_excluded_characters_as_ranges_for_regex(extra_excluded string) string {
 
 }
 
-func functions_for(opts *Options) (pattern string, post_processors []PostProcessorFunc, group_processors []GroupProcessorFunc, err error) {
+// Build the alternation of URL prefixes, longest first so that the regex
+// engine does not first try a prefix that is the start of a longer one, and
+// with http and https merged, as they are the most common
+func url_prefixes_pattern(url_prefixes *utils.Set[string]) string {
+	prefixes := url_prefixes.AsSlice()
+	if url_prefixes.Has("http") && url_prefixes.Has("https") {
+		prefixes = slices.DeleteFunc(prefixes, func(x string) bool { return x == "http" || x == "https" })
+		prefixes = append(prefixes, "https?")
+	}
+	slices.SortFunc(prefixes, func(a, b string) int {
+		if len(a) != len(b) {
+			return len(b) - len(a)
+		}
+		return strings.Compare(a, b)
+	})
+	return strings.Join(prefixes, "|")
+}
+
+func functions_for(opts *Options) (pattern string, post_processor PostProcessorFunc, group_processors []GroupProcessorFunc, err error) {
 	switch opts.Type {
 	case "url":
 		var url_prefixes *utils.Set[string]
@@ -363,11 +410,11 @@ func functions_for(opts *Options) (pattern string, post_processors []PostProcess
 				return
 			}
 		}
-		pattern = fmt.Sprintf(`(?:%s)://[^%s]{3,}`, strings.Join(url_prefixes.AsSlice(), "|"), url_excluded_characters_as_ranges_for_regex(url_excluded_characters))
-		post_processors = append(post_processors, PostProcessorMap()["url"])
+		pattern = fmt.Sprintf(`(?:%s)://[^%s]{3,}`, url_prefixes_pattern(url_prefixes), url_excluded_characters_as_ranges_for_regex(url_excluded_characters))
+		post_processor = PostProcessorMap()["url"]
 	case "path":
 		pattern = path_regex()
-		post_processors = append(post_processors, PostProcessorMap()["brackets"], PostProcessorMap()["quotes"])
+		post_processor = PostProcessorMap()["brackets_and_quotes"]
 	case "line":
 		pattern = "(?m)^\\s*(.+)[\\s\x00]*$"
 	case "hash":
@@ -378,14 +425,14 @@ func functions_for(opts *Options) (pattern string, post_processors []PostProcess
 		`((?:\d{1,3}\.){3}\d{1,3}` + "|" +
 			// IPv6 with no validation
 			`(?:[a-fA-F0-9]{0,4}:){2,7}[a-fA-F0-9]{1,4})`)
-		post_processors = append(post_processors, PostProcessorMap()["ip"])
+		post_processor = PostProcessorMap()["ip"]
 	default:
 		pattern = opts.Regex
 		if opts.Type == "linenum" {
 			if pattern == kitty.HintsDefaultRegex {
 				pattern = default_linenum_regex()
 			}
-			post_processors = append(post_processors, PostProcessorMap()["brackets"], PostProcessorMap()["quotes"])
+			post_processor = PostProcessorMap()["brackets_and_quotes"]
 			group_processors = append(group_processors, linenum_group_processor)
 		}
 	}
@@ -468,16 +515,25 @@ func find_all_matches(re *regexp2.Regexp, text string) (ans []Match, err error)
 		return
 	}
 
+	// the set of groups is a property of the pattern, so work out which
+	// groups are named only once
+	var is_named []bool
 	for m != nil {
 		groups := m.Groups()
 		bom, err := get_byte_offset_map(groups)
 		if err != nil {
 			return nil, err
 		}
+		if is_named == nil {
+			is_named = make([]bool, len(groups))
+			for i, g := range groups {
+				is_named[i] = g.Name != "" && g.Name != strconv.Itoa(i)
+			}
+		}
 		match := Match{Groups: make([]Group, len(groups))}
-		for i, g := range m.Groups() {
+		for i, g := range groups {
 			match.Groups[i].Name = g.Name
-			match.Groups[i].IsNamed = g.Name != "" && g.Name != strconv.Itoa(i)
+			match.Groups[i].IsNamed = is_named[i]
 			for _, c := range g.Captures {
 				cn := Capture{Text: c.String(), Text_as_runes: c.Runes()}
 				cn.Rune_Offsets.End = c.Index + c.Length
@@ -492,48 +548,92 @@ func find_all_matches(re *regexp2.Regexp, text string) (ans []Match, err error)
 	return
 }
 
-func mark(r *regexp2.Regexp, post_processors []PostProcessorFunc, group_processors []GroupProcessorFunc, text string, opts *Options) (ans []Mark) {
-	sanitize_pat := regexp.MustCompile("[\r\n\x00]")
-	all_matches, _ := find_all_matches(r, text)
+// Shared by all marks whose pattern has no named groups, must not be modified
+var empty_groupdict = map[string]any{}
+
+// 1 for the characters a hash can start with, 2 for the other characters
+// it can contain
+var hash_chars = sync.OnceValue(func() (ans [256]byte) {
+	for _, ch := range []byte("0123456789abcdef") {
+		ans[ch] = 1
+	}
+	ans['\r'] = 2
+	return
+})
+
+// Find the same matches as the hash pattern, [0-9a-f][0-9a-f\r]{6,127},
+// with a simple scan, as the regex engine is very slow for such a pattern
+func find_hashes(text string) (ans []Match) {
+	const min_len, max_len = 7, 128
+	table := hash_chars()
+	for i := 0; i < len(text); i++ {
+		if table[text[i]] != 1 {
+			continue
+		}
+		end := i + 1
+		for end < len(text) && end-i < max_len && table[text[end]] != 0 {
+			end++
+		}
+		if end-i >= min_len {
+			c := Capture{Text: text[i:end]}
+			c.Byte_Offsets.Start, c.Byte_Offsets.End = i, end
+			ans = append(ans, Match{Groups: []Group{{Captures: []Capture{c}}}})
+		}
+		// no shorter match can start inside this run
+		i = end - 1
+	}
+	return
+}
+
+func mark(all_matches []Match, post_processor PostProcessorFunc, group_processors []GroupProcessorFunc, text string, opts *Options) (ans []Mark) {
+	sanitize_pat := sanitize_regex()
+	if len(all_matches) == 0 {
+		return
+	}
+	// All matches have the same groups, so whether to restrict the match to
+	// the first numbered group and whether a groupdict is needed are
+	// decided once for the pattern
+	has_named_groups := all_matches[0].HasNamedGroups()
+	use_first_group := opts.Type == "regex" && len(all_matches[0].Groups) > 1 && !has_named_groups
+	needs_groupdict := has_named_groups || len(group_processors) > 0
 	for i, m := range all_matches {
 		full_capture := m.Groups[0].LastCapture()
 		match_start, match_end := full_capture.Byte_Offsets.Start, full_capture.Byte_Offsets.End
-		for match_end > match_start+1 && text[match_end-1] == 0 {
-			match_end--
-		}
+		// trim trailing nulls, keeping at least one character of the match
+		trimmed := strings.TrimRight(text[match_start:match_end], "\x00")
+		match_end = max(min(match_end, match_start+1), match_start+len(trimmed))
 		full_match := text[match_start:match_end]
 		if len([]rune(full_match)) < opts.MinimumMatchLength {
 			continue
 		}
-		for _, f := range post_processors {
-			match_start, match_end = f(text, match_start, match_end)
-			if match_start < 0 {
-				break
+		if post_processor != nil {
+			if match_start, match_end = post_processor(text, match_start, match_end); match_start < 0 {
+				continue
 			}
 		}
-		if match_start < 0 {
-			continue
-		}
 		full_match = sanitize_pat.ReplaceAllLiteralString(text[match_start:match_end], "")
-		gd := make(map[string]string, len(m.Groups))
-		for idx, g := range m.Groups {
-			if idx > 0 && g.IsNamed {
-				c := g.LastCapture()
-				if s, e := c.Byte_Offsets.Start, c.Byte_Offsets.End; s > -1 && e > -1 {
-					s = max(s, match_start)
-					e = min(e, match_end)
-					gd[g.Name] = sanitize_pat.ReplaceAllLiteralString(text[s:e], "")
+		gd2 := empty_groupdict
+		if needs_groupdict {
+			gd := make(map[string]string, len(m.Groups))
+			for idx, g := range m.Groups {
+				if idx > 0 && g.IsNamed {
+					c := g.LastCapture()
+					if s, e := c.Byte_Offsets.Start, c.Byte_Offsets.End; s > -1 && e > -1 {
+						s = max(s, match_start)
+						e = min(e, match_end)
+						gd[g.Name] = sanitize_pat.ReplaceAllLiteralString(text[s:e], "")
+					}
 				}
 			}
+			for _, f := range group_processors {
+				f(gd)
+			}
+			gd2 = make(map[string]any, len(gd))
+			for k, v := range gd {
+				gd2[k] = v
+			}
 		}
-		for _, f := range group_processors {
-			f(gd)
-		}
-		gd2 := make(map[string]any, len(gd))
-		for k, v := range gd {
-			gd2[k] = v
-		}
-		if opts.Type == "regex" && len(m.Groups) > 1 && !m.HasNamedGroups() {
+		if use_first_group {
 			cp := m.Groups[1].LastCapture()
 			ms, me := cp.Byte_Offsets.Start, cp.Byte_Offsets.End
 			match_start = max(match_start, ms)
@@ -570,17 +670,12 @@ func mark_words(text string, opts *Options) (ans []Mark) {
 		allowed_chars[ch] = true
 	}
 	pos := 0
-	post_processors := []PostProcessorFunc{PostProcessorMap()["brackets"], PostProcessorMap()["quotes"]}
+	post_processor := PostProcessorMap()["brackets_and_quotes"]
 
 	commit_run := func() {
 		if len(current_run.chars) >= opts.MinimumMatchLength {
 			match_start, match_end := current_run.start, current_run.start+current_run.size
-			for _, f := range post_processors {
-				match_start, match_end = f(text, match_start, match_end)
-				if match_start < 0 {
-					break
-				}
-			}
+			match_start, match_end = post_processor(text, match_start, match_end)
 			if match_start > -1 && match_end > match_start {
 				full_match := text[match_start:match_end]
 				if len([]rune(full_match)) >= opts.MinimumMatchLength {
@@ -652,16 +747,26 @@ func find_marks(text string, opts *Options, cli_args ...string) (sanitized_text
 	used_pattern := ""
 
 	run_basic_matching := func() error {
-		pattern, post_processors, group_processors, err := functions_for(opts)
+		pattern, post_processor, group_processors, err := functions_for(opts)
 		if err != nil {
 			return err
 		}
-		r, err := regexp2.Compile(pattern, regexp2.RE2)
-		if err != nil {
-			return fmt.Errorf("Failed to compile the regex pattern: %#v with error: %w", pattern, err)
-		}
-		ans = mark(r, post_processors, group_processors, sanitized_text, opts)
 		used_pattern = pattern
+		var all_matches []Match
+		if opts.Type == "hash" {
+			all_matches = find_hashes(sanitized_text)
+		} else {
+			r, err := regexp2.Compile(pattern, regexp2.RE2)
+			if err != nil {
+				return fmt.Errorf("Failed to compile the regex pattern: %#v with error: %w", pattern, err)
+			}
+			// every URL contains :// so dont bother running the regex
+			// engine over a screen that has no URLs
+			if opts.Type != "url" || strings.Contains(sanitized_text, "://") {
+				all_matches, _ = find_all_matches(r, sanitized_text)
+			}
+		}
+		ans = mark(all_matches, post_processor, group_processors, sanitized_text, opts)
 		return nil
 	}
 
@@ -707,14 +812,26 @@ process_answer:
 		return "", nil, nil, &ErrNoMatches{Type: opts.Type, Pattern: used_pattern}
 	}
 	largest_index := ans[len(ans)-1].Index
-	offset := max(0, opts.HintsOffset)
+	// The URL post processor can extend a match to a closing bracket beyond
+	// the start of the next URL. Such an overlapping mark cannot be drawn,
+	// so drop it rather than offer a hint that is never displayed.
+	kept, end := ans[:0], 0
+	for _, m := range ans {
+		if m.Start >= end {
+			kept = append(kept, m)
+			end = m.End
+		}
+	}
+	ans = kept
+	offset, sign := max(0, opts.HintsOffset), 1
+	if !opts.Ascending {
+		offset, sign = offset+largest_index, -1
+	}
 	index_map = make(map[int]*Mark, len(ans))
 	for i := range ans {
 		m := &ans[i]
-		if opts.Ascending {
-			m.Index += offset
-		} else {
-			m.Index = largest_index - m.Index + offset
+		if m.Index = offset + sign*m.Index; m.Index < 0 {
+			return "", nil, nil, fmt.Errorf("The mark indices must be non-negative and the last mark must have the largest index")
 		}
 		index_map[m.Index] = m
 	}
@@ -65,8 +65,21 @@ func TestHintMarking(t *testing.T) {
 	r("link:"+u+"[xxx]", u)
 	r("`xyz <"+u+">`_.", u)
 	r(`<a href="`+u+`">moo`, u)
+	// the first URL is extended to the closing bracket, overlapping the second
+	r("(http://a.com/x http://b.com/y)", "http://a.com/x http://b.com/y")
 	r("\x1b[mhttp://test.me/1234\n\x1b[mx", "http://test.me/1234")
 	r("\x1b[mhttp://test.me/12345\r\x1b[m6\n\x1b[mx", "http://test.me/123456")
+	opts.UrlPrefixes = "http,https,ftp,ftps"
+	r("https://test.me ftps://test.me http://test.me", "https://test.me", "ftps://test.me", "http://test.me")
+	if p := url_prefixes_pattern(utils.NewSetWithItems("http", "ftp", "https", "ftps", "file")); p != `https?|file|ftps|ftp` {
+		t.Fatalf("Incorrect URL prefixes pattern: %#v", p)
+	}
+	// an invalid pattern must be reported even if there are no URLs
+	opts.UrlPrefixes = "ht(tp"
+	if _, _, _, err := find_marks("no urls here", opts); err == nil || errors.As(err, new(*ErrNoMatches)) {
+		t.Fatalf("Invalid URL prefixes not reported, got error: %v", err)
+	}
+	opts.UrlPrefixes = "default"
 
 	opts.Type = "linenum"
 	m := func(text, path string, line int) {
@@ -95,6 +108,15 @@ func TestHintMarking(t *testing.T) {
 	r("(file.epub)", "file.epub")
 	r("some/path", "some/path")
 
+	reset()
+	cols = 60
+	opts.Type = "hash"
+	r(`commit 2b687c2a (HEAD)`, `2b687c2a`)
+	r(`abc123 deadbeef0 xyz`, `deadbeef0`)
+	r(`2b687c2 0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdefff`,
+		`2b687c2`, `0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef`)
+	r(`abcdef`)
+
 	reset()
 	cols = 60
 	opts.Type = "ip"
@@ -29,6 +29,15 @@ func (self *Context) SprintFunc(spec string) func(args ...any) string {
 	}
 }
 
+// Return the escape codes that surround text styled with spec, for writing
+// styled text directly into a buffer
+func (self *Context) PrefixAndSuffix(spec string) (prefix, suffix string) {
+	if !self.AllowEscapeCodes {
+		return "", ""
+	}
+	return prefix_for_spec(spec), suffix_for_spec(spec)
+}
+
 func (self *Context) UrlFunc(spec string) func(string, string) string {
 	p := prefix_for_spec(spec)
 	s := suffix_for_spec(spec)
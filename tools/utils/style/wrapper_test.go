@@ -30,6 +30,9 @@ func TestANSIStyleSprint(t *testing.T) {
 		if actual != expected {
 			t.Fatalf("Formatting with spec: %s failed expected != actual: %#v != %#v", spec, expected, actual)
 		}
+		if p, s := ctx.PrefixAndSuffix(spec); p != prefix || s != suffix {
+			t.Fatalf("Prefix and suffix for spec: %s incorrect expected != actual: %#v, %#v != %#v, %#v", spec, prefix, suffix, p, s)
+		}
 	}
 
 	test("", "", "")